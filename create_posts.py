@@ -6,12 +6,37 @@ import argparse
 import html
 import json
 import os
+import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Iterable
 
-import requests
-from requests.auth import HTTPBasicAuth
+if TYPE_CHECKING:
+    import requests
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional speedup, stdlib json is used instead
+    orjson = None
+
+HTTP_POOL_SIZE = 32
+_PARAGRAPH_BREAK_RE = re.compile(r"\r?\n\s*\r?\n")
+# Same env line grammar as upload_media: only a matching pair of quotes is removed.
+_ENV_LINE_RE = re.compile(r"""^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(?:(["'])(.*)\2|(.*?))\s*$""")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Category workers report progress concurrently; one lock keeps their lines whole.
+_OUTPUT_LOCK = threading.Lock()
+
+# Gutenberg markup for generated posts; placeholders are filled with already-escaped values.
+SHORTCODE_TEMPLATE = '[dharma_player audio="{audio}" image="{image}" title="{title}" skip="{skip}"]'
+PARAGRAPH_BLOCK_TEMPLATE = "<!-- wp:paragraph -->\n<p>{text}</p>\n<!-- /wp:paragraph -->"
+POST_CONTENT_TEMPLATE = "<!-- wp:shortcode -->\n{shortcode}\n<!-- /wp:shortcode -->\n\n{description}"
+# WordPress rejects batch requests with more than 25 sub-requests by default.
+BATCH_MAX_REQUESTS = 25
 
 
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
@@ -61,6 +86,23 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         action="store_true",
         help="List the posts that would be created without calling WordPress",
     )
+    parser.add_argument(
+        "--no-batch",
+        action="store_true",
+        help=(
+            "Create posts one request at a time instead of using the REST batch endpoint. Posts are then "
+            "created in parallel and may not follow playlist order; add --max-concurrency 1 to keep it"
+        ),
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=8,
+        help=(
+            "Maximum number of posts created in parallel (default: 8). Without the batch endpoint, values "
+            "above 1 give up playlist order"
+        ),
+    )
     return parser.parse_args(argv)
 
 
@@ -69,26 +111,35 @@ def load_env_file(path: Path) -> None:
     if not path.exists():
         raise FileNotFoundError(f"Env file not found: {path}")
 
-    for raw_line in path.read_text(encoding="utf-8").splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("#"):
-            continue
-        if "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        key = key.strip()
-        if not key:
-            continue
-        value = value.strip().strip('"').strip("'")
-        os.environ[key] = value
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            match = _ENV_LINE_RE.match(line)
+            if match is None:
+                continue
+            key, quote, quoted, bare = match.groups()
+            os.environ[key] = quoted if quote else bare
+
+
+def locked_print(*args, **kwargs) -> None:
+    """``print`` that never interleaves with output from other worker threads."""
+    with _OUTPUT_LOCK:
+        print(*args, **kwargs)
+
+
+def encode_json(payload: object) -> bytes:
+    """Serialize a request body, using orjson when it is installed."""
+    if orjson:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
 
 
 def load_metadata(metadata_path: Path) -> list[dict[str, str]]:
     if not metadata_path.exists():
         raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
 
+    raw = metadata_path.read_bytes()
     try:
-        payload = json.loads(metadata_path.read_text(encoding="utf-8"))
+        payload = orjson.loads(raw) if orjson else json.loads(raw)
     except json.JSONDecodeError as err:
         raise ValueError(f"Could not parse {metadata_path}: {err}") from err
 
@@ -125,86 +176,83 @@ def build_media_base(site: str, uploads_path: str) -> str:
 
 
 def build_shortcode(media_base: str, video_id: str, title: str, skip: int) -> str:
-    safe_title = html.escape(title, quote=True)
-    audio_url = f"{media_base}{video_id}.mp3"
-    image_url = f"{media_base}{video_id}.jpg"
-    return (
-        f"[dharma_player audio=\"{audio_url}\" image=\"{image_url}\" "
-        f"title=\"{safe_title}\" skip=\"{skip}\"]"
+    return SHORTCODE_TEMPLATE.format(
+        audio=f"{media_base}{video_id}.mp3",
+        image=f"{media_base}{video_id}.jpg",
+        title=html.escape(title, quote=True),
+        skip=skip,
     )
 
 
 def render_description_block(description: str) -> str:
-    paragraphs: list[str] = []
-    current: list[str] = []
-    for line in description.splitlines():
-        stripped = line.strip()
-        if stripped:
-            current.append(stripped)
-        elif current:
-            paragraphs.append(" ".join(current))
-            current = []
-    if current:
-        paragraphs.append(" ".join(current))
-
+    # str.split() without arguments collapses each paragraph's line breaks and runs of whitespace.
+    paragraphs = [" ".join(chunk.split()) for chunk in _PARAGRAPH_BREAK_RE.split(description) if chunk.strip()]
     if not paragraphs:
-        return "<!-- wp:paragraph -->\n<p></p>\n<!-- /wp:paragraph -->"
-
-    rendered = []
-    for paragraph in paragraphs:
-        rendered.append("<!-- wp:paragraph -->")
-        rendered.append(f"<p>{html.escape(paragraph)}</p>")
-        rendered.append("<!-- /wp:paragraph -->")
-    return "\n".join(rendered)
+        return PARAGRAPH_BLOCK_TEMPLATE.format(text="")
+    return "\n".join(PARAGRAPH_BLOCK_TEMPLATE.format(text=html.escape(paragraph)) for paragraph in paragraphs)
 
 
 def build_post_content(media_base: str, entry: dict[str, str], skip: int) -> str:
-    shortcode_block = [
-        "<!-- wp:shortcode -->",
-        build_shortcode(media_base, entry["id"], entry["title"], skip),
-        "<!-- /wp:shortcode -->",
-        "",
-    ]
-    description_block = render_description_block(entry["description"])
-    return "\n".join(shortcode_block) + "\n" + description_block
+    return POST_CONTENT_TEMPLATE.format(
+        shortcode=build_shortcode(media_base, entry["id"], entry["title"], skip),
+        description=render_description_block(entry["description"]),
+    )
 
 
 def find_metadata_directories(root: Path, metadata_filename: str, allowed_categories: set[str] | None) -> list[tuple[str, Path]]:
     if not root.exists() or not root.is_dir():
         raise FileNotFoundError(f"Data root not found: {root}")
 
+    # DirEntry.is_dir() answers from the directory listing without an extra stat.
+    with os.scandir(root) as it:
+        subdirs = sorted((entry for entry in it if entry.is_dir()), key=lambda entry: entry.name)
+
     discovered: list[tuple[str, Path]] = []
-    for candidate in sorted(root.iterdir()):
-        if not candidate.is_dir():
-            continue
-        category_name = candidate.name
+    for entry in subdirs:
+        category_name = entry.name
         if allowed_categories and category_name not in allowed_categories:
             continue
+        candidate = Path(entry.path)
         metadata_path = candidate / metadata_filename
-        if metadata_path.exists():
+        if metadata_path.is_file():
             discovered.append((category_name, metadata_path))
         else:
             print(f"Skipping {candidate}: missing {metadata_filename}")
     return discovered
 
 
-def ensure_category(session: requests.Session, site: str, category_name: str) -> int:
+def load_all_categories(session: requests.Session, site: str) -> dict[str, int]:
+    """Return every WordPress category ID keyed by lower-cased name."""
     categories_endpoint = site.rstrip("/") + "/wp-json/wp/v2/categories"
-    params = {
-        "search": category_name,
-        "per_page": 100,
-    }
-    response = session.get(categories_endpoint, params=params, timeout=30)
-    if response.status_code >= 400:
-        raise RuntimeError(
-            f"Failed to list categories for '{category_name}': {response.status_code} {response.text.strip()}"
-        )
-    for item in response.json():
-        if item.get("name", "").lower() == category_name.lower():
-            return int(item["id"])
+    categories: dict[str, int] = {}
+    page = 1
+    while True:
+        params = {
+            "per_page": 100,
+            "page": page,
+        }
+        response = session.get(categories_endpoint, params=params, timeout=30)
+        if response.status_code >= 400:
+            raise RuntimeError(f"Failed to list categories: {response.status_code} {response.text.strip()}")
+        for item in response.json():
+            # The REST API returns names HTML-escaped (e.g. "&amp;").
+            name = html.unescape(item.get("name", ""))
+            categories.setdefault(name.lower(), int(item["id"]))
+        total_pages = int(response.headers.get("X-WP-TotalPages") or 1)
+        if page >= total_pages:
+            return categories
+        page += 1
+
+
+def ensure_category(session: requests.Session, site: str, category_name: str, categories: dict[str, int]) -> int:
+    """Return the ID for ``category_name``, creating it when missing from ``categories``."""
+    key = category_name.lower()
+    if key in categories:
+        return categories[key]
 
+    categories_endpoint = site.rstrip("/") + "/wp-json/wp/v2/categories"
     payload = {"name": category_name}
-    create_response = session.post(categories_endpoint, json=payload, timeout=30)
+    create_response = session.post(categories_endpoint, data=encode_json(payload), headers=JSON_HEADERS, timeout=30)
     if create_response.status_code >= 400:
         raise RuntimeError(
             f"Failed to create category '{category_name}': {create_response.status_code} {create_response.text.strip()}"
@@ -213,10 +261,20 @@ def ensure_category(session: requests.Session, site: str, category_name: str) ->
     category_id = created.get("id")
     if not isinstance(category_id, int):
         raise RuntimeError(f"Unexpected response creating category '{category_name}': {created}")
-    print(f"Created category '{category_name}' as ID {category_id}")
+    locked_print(f"Created category '{category_name}' as ID {category_id}")
+    categories[key] = category_id
     return category_id
 
 
+def build_post_payload(title: str, content: str, category_id: int, status: str) -> dict:
+    return {
+        "title": title,
+        "content": content,
+        "status": status,
+        "categories": [category_id],
+    }
+
+
 def create_post(
     session: requests.Session,
     site: str,
@@ -226,13 +284,8 @@ def create_post(
     status: str,
 ) -> dict:
     posts_endpoint = site.rstrip("/") + "/wp-json/wp/v2/posts"
-    payload = {
-        "title": title,
-        "content": content,
-        "status": status,
-        "categories": [category_id],
-    }
-    response = session.post(posts_endpoint, json=payload, timeout=60)
+    payload = build_post_payload(title, content, category_id, status)
+    response = session.post(posts_endpoint, data=encode_json(payload), headers=JSON_HEADERS, timeout=60)
     if response.status_code >= 400:
         raise RuntimeError(
             f"Failed to create post '{title}': {response.status_code} {response.text.strip()}"
@@ -240,9 +293,139 @@ def create_post(
     return response.json()
 
 
+def batch_create_posts(session: requests.Session, site: str, payloads: list[dict]) -> list[dict | None] | None:
+    """Create posts through the REST batch endpoint (WordPress 5.6+), 25 per request.
+
+    Returns one ``{"status": ..., "body": ...}`` envelope per payload, in order.
+    An entry is None when its batch was rejected because another post in it
+    failed validation. Returns None when the site has no batch endpoint.
+    """
+    batch_endpoint = site.rstrip("/") + "/wp-json/batch/v1"
+    results: list[dict | None] = []
+    for start in range(0, len(payloads), BATCH_MAX_REQUESTS):
+        chunk = payloads[start : start + BATCH_MAX_REQUESTS]
+        body = {
+            "validation": "require-all-validate",
+            "requests": [{"method": "POST", "path": "/wp/v2/posts", "body": payload} for payload in chunk],
+        }
+        response = session.post(batch_endpoint, data=encode_json(body), headers=JSON_HEADERS, timeout=120)
+        if response.status_code == 404 and not results:
+            return None
+        if response.status_code >= 400:
+            failure = {"status": response.status_code, "body": {"message": response.text.strip()}}
+            results.extend(failure for _ in chunk)
+            continue
+        responses = response.json().get("responses") or []
+        results.extend(responses[: len(chunk)])
+        results.extend(None for _ in range(len(chunk) - len(responses)))
+    return results
+
+
+def build_session(username: str, app_password: str, pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Return an authenticated session with a larger connection pool and GET retries."""
+    # Imported here so --help and --dry-run never load the HTTP stack.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.auth import HTTPBasicAuth
+    from urllib3.util import Retry
+
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(username, app_password)
+    # Only idempotent requests are retried: replaying a POST that timed out
+    # after WordPress accepted it would create a duplicate post or category.
+    retries = Retry(
+        total=5,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def publish_category(
+    session: requests.Session,
+    site: str,
+    category_name: str,
+    entries: list[dict[str, str]],
+    *,
+    media_base: str,
+    skip: int,
+    status: str,
+    categories: dict[str, int],
+    post_executor: ThreadPoolExecutor,
+    batch_unavailable: threading.Event,
+) -> None:
+    """Create one post per entry in ``category_name``, batching when the site supports it."""
+    try:
+        category_id = ensure_category(session, site, category_name, categories)
+    except RuntimeError as err:
+        locked_print(str(err), file=sys.stderr)
+        return
+
+    contents = [build_post_content(media_base, entry, skip) for entry in entries]
+
+    if not batch_unavailable.is_set():
+        payloads = [
+            build_post_payload(entry["title"], content, category_id, status)
+            for entry, content in zip(entries, contents)
+        ]
+        results = batch_create_posts(session, site, payloads)
+        if results is not None:
+            for entry, result in zip(entries, results):
+                if result is None:
+                    locked_print(
+                        f"Skipped post '{entry['title']}': another post in its batch failed validation",
+                        file=sys.stderr,
+                    )
+                    continue
+                body = result.get("body") or {}
+                if result.get("status", 500) >= 400:
+                    locked_print(
+                        f"Failed to create post '{entry['title']}': {result.get('status')} "
+                        f"{body.get('message', '')}",
+                        file=sys.stderr,
+                    )
+                    continue
+                locked_print(
+                    f"- Created post '{entry['title']}' as ID {body.get('id', 'unknown')} "
+                    f"({body.get('link', 'no link')})"
+                )
+            return
+        if not batch_unavailable.is_set():
+            batch_unavailable.set()
+            locked_print("Batch endpoint not available; creating posts individually")
+
+    # Posts finish in whatever order the workers complete, and WordPress lists
+    # them by date, so playlist order is only kept with a single worker.
+    futures = {
+        post_executor.submit(create_post, session, site, entry["title"], content, category_id, status): entry
+        for entry, content in zip(entries, contents)
+    }
+    for future in as_completed(futures):
+        entry = futures[future]
+        try:
+            response = future.result()
+        except RuntimeError as err:
+            locked_print(str(err), file=sys.stderr)
+            continue
+
+        locked_print(
+            f"- Created post '{entry['title']}' as ID {response.get('id', 'unknown')} "
+            f"({response.get('link', 'no link')})"
+        )
+
+
 def main(argv: Iterable[str] | None = None) -> None:
     args = parse_args(argv)
 
+    if args.max_concurrency < 1:
+        print("--max-concurrency must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+
     try:
         load_env_file(args.env_file)
     except FileNotFoundError:
@@ -286,65 +469,73 @@ def main(argv: Iterable[str] | None = None) -> None:
     else:
         media_base = build_media_base(site, uploads_path)
 
-    with requests.Session() as session:
-        session.auth = HTTPBasicAuth(username, app_password)
-
-        category_cache: dict[str, int] = {}
+    pending: list[tuple[str, list[dict[str, str]]]] = []
+    for category_name, metadata_path in metadata_dirs:
+        try:
+            entries = load_metadata(metadata_path)
+        except (FileNotFoundError, ValueError) as err:
+            print(str(err), file=sys.stderr)
+            continue
 
-        for category_name, metadata_path in metadata_dirs:
-            try:
-                entries = load_metadata(metadata_path)
-            except (FileNotFoundError, ValueError) as err:
-                print(str(err), file=sys.stderr)
-                continue
+        if not entries:
+            print(f"No entries in {metadata_path}")
+            continue
 
-            if not entries:
-                print(f"No entries in {metadata_path}")
-                continue
+        print(f"Processing category '{category_name}' ({len(entries)} posts)")
+        if args.dry_run:
+            with os.scandir(metadata_path.parent) as it:
+                present = {item.name for item in it}
+            for entry in entries:
+                audio_name = f"{entry['id']}.mp3"
+                image_name = f"{entry['id']}.jpg"
+                audio_status = "present" if audio_name in present else "missing"
+                image_status = "present" if image_name in present else "missing"
+                print(f"- Would create post '{entry['title']}'")
+                print(f"  audio: {audio_name} [{audio_status}]")
+                print(f"  image: {image_name} [{image_status}]")
+            continue
 
-            if category_name not in category_cache and not args.dry_run:
-                try:
-                    category_cache[category_name] = ensure_category(session, site, category_name)
-                except RuntimeError as err:
-                    print(str(err), file=sys.stderr)
-                    continue
-            elif category_name not in category_cache:
-                category_cache[category_name] = -1  # placeholder for dry-run
+        pending.append((category_name, entries))
 
-            print(f"Processing category '{category_name}' ({len(entries)} posts)")
-            for entry in entries:
-                content = build_post_content(media_base, entry, args.skip)
-                if args.dry_run:
-                    audio_name = f"{entry['id']}.mp3"
-                    image_name = f"{entry['id']}.jpg"
-                    audio_path = metadata_path.parent / audio_name
-                    image_path = metadata_path.parent / image_name
-                    audio_status = "present" if audio_path.exists() else "missing"
-                    image_status = "present" if image_path.exists() else "missing"
-                    print(f"- Would create post '{entry['title']}'")
-                    print(f"  audio: {audio_name} [{audio_status}]")
-                    print(f"  image: {image_name} [{image_status}]")
-                    continue
+    if not pending:
+        return
 
-                category_id = category_cache[category_name]
-                if category_id < 0:
-                    try:
-                        category_id = ensure_category(session, site, category_name)
-                        category_cache[category_name] = category_id
-                    except RuntimeError as err:
-                        print(str(err), file=sys.stderr)
-                        break
-
-                try:
-                    response = create_post(session, site, entry["title"], content, category_id, args.status)
-                except RuntimeError as err:
-                    print(str(err), file=sys.stderr)
-                    continue
+    # Category workers and per-post workers can each hold a connection at once.
+    pool_size = max(HTTP_POOL_SIZE, 2 * args.max_concurrency)
+    with build_session(username, app_password, pool_size=pool_size) as session:
+        try:
+            categories = load_all_categories(session, site)
+        except RuntimeError as err:
+            print(str(err), file=sys.stderr)
+            sys.exit(1)
 
-                print(
-                    f"- Created post '{entry['title']}' as ID {response.get('id', 'unknown')} "
-                    f"({response.get('link', 'no link')})"
+        batch_unavailable = threading.Event()
+        if args.no_batch:
+            batch_unavailable.set()
+
+        # Categories run concurrently; the per-post fallback path shares a
+        # separate pool so category workers never wait on their own pool.
+        with ThreadPoolExecutor(max_workers=args.max_concurrency) as post_executor, ThreadPoolExecutor(
+            max_workers=min(args.max_concurrency, len(pending))
+        ) as category_executor:
+            futures = [
+                category_executor.submit(
+                    publish_category,
+                    session,
+                    site,
+                    category_name,
+                    entries,
+                    media_base=media_base,
+                    skip=args.skip,
+                    status=args.status,
+                    categories=categories,
+                    post_executor=post_executor,
+                    batch_unavailable=batch_unavailable,
                 )
+                for category_name, entries in pending
+            ]
+            for future in futures:
+                future.result()
 
 
 if __name__ == "__main__":
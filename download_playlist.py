@@ -4,19 +4,24 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from email.utils import formatdate
 from pathlib import Path
-from typing import Iterable, List
-from urllib import error, request
+from typing import TYPE_CHECKING, Iterable, List
 
-try:
+if TYPE_CHECKING:
+    import requests
     import yt_dlp  # type: ignore
-    from yt_dlp.utils import DownloadError  # type: ignore
-except ImportError as err:
-    print("yt_dlp is required to run this script. Install it with 'pip install yt-dlp'.", file=sys.stderr)
-    raise
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional speedup, stdlib json is used instead
+    orjson = None
 
 THUMBNAIL_CANDIDATES = (
     "maxresdefault.jpg",
@@ -25,7 +30,14 @@ THUMBNAIL_CANDIDATES = (
     "mqdefault.jpg",
     "default.jpg",
 )
+_THUMBNAIL_URL_TEMPLATES = tuple("https://i.ytimg.com/vi/{video_id}/" + candidate for candidate in THUMBNAIL_CANDIDATES)
+THUMBNAIL_TIMEOUT = 30
+STREAM_CHUNK_SIZE = 64 * 1024
+# Name marker for audio that yt_dlp is still downloading or converting.
+INCOMING_SUFFIX = ".incoming"
 INVALID_PATH_CHARS = set('<>:"/\\|?*')
+_INVALID_PATH_TRANS = str.maketrans(dict.fromkeys(INVALID_PATH_CHARS, "_"))
+_WS_RE = re.compile(r"\s+")
 
 
 @dataclass
@@ -50,8 +62,9 @@ def load_existing_metadata(metadata_path: Path) -> dict[str, VideoMetadata]:
     if not metadata_path.exists():
         return {}
 
+    raw = metadata_path.read_bytes()
     try:
-        payload = json.loads(metadata_path.read_text(encoding="utf-8"))
+        payload = orjson.loads(raw) if orjson else json.loads(raw)
     except json.JSONDecodeError as err:
         print(f"Could not parse existing metadata file {metadata_path}: {err}", file=sys.stderr)
         return {}
@@ -90,15 +103,18 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         type=Path,
         help="Path to cookies file exported from a browser for authenticated YouTube access",
     )
+    parser.add_argument(
+        "--refresh-thumbnails",
+        action="store_true",
+        help="Re-check existing thumbnails and download them again only if YouTube has a newer version",
+    )
     return parser.parse_args(argv)
 
 
 def sanitize_path_segment(name: str, fallback: str = "playlist") -> str:
-    sanitized = "".join("_" if ch in INVALID_PATH_CHARS else ch for ch in name).strip()
-    sanitized = re.sub(r"\s+", " ", sanitized)
+    sanitized = _WS_RE.sub(" ", name.translate(_INVALID_PATH_TRANS)).strip()
     sanitized = sanitized.rstrip(".")  # avoid trailing dots on Windows
-    sanitized = sanitized or fallback
-    return sanitized
+    return sanitized or fallback
 
 
 def ensure_output_dir(base_dir: Path, playlist_title: str, playlist_id: str) -> Path:
@@ -108,24 +124,123 @@ def ensure_output_dir(base_dir: Path, playlist_title: str, playlist_id: str) ->
     return destination
 
 
-def download_thumbnail(video_id: str, destination: Path) -> None:
-    base_url = f"https://i.ytimg.com/vi/{video_id}/"
-    for candidate in THUMBNAIL_CANDIDATES:
-        url = base_url + candidate
-        try:
-            with request.urlopen(url) as response:  # noqa: S310 - URL built from trusted template
-                if response.status != 200:
-                    continue
-                data = response.read()
-                destination.write_bytes(data)
-                return
-        except error.HTTPError as http_err:
-            if http_err.code == 404:
-                continue
-            raise
+def load_yt_dlp():
+    """Import yt_dlp on first use.
+
+    Importing it registers hundreds of extractors, which ``--help`` and callers
+    that only need helpers such as sanitize_path_segment should not pay for.
+    """
+    try:
+        import yt_dlp  # type: ignore
+    except ImportError:
+        print("yt_dlp is required to run this script. Install it with 'pip install yt-dlp'.", file=sys.stderr)
+        raise
+    return yt_dlp
+
+
+_thumbnail_session: requests.Session | None = None
+_thumbnail_session_lock = threading.Lock()
+
+
+def thumbnail_session() -> requests.Session:
+    """Return the keep-alive session shared by every thumbnail request in the run."""
+    global _thumbnail_session
+    with _thumbnail_session_lock:
+        if _thumbnail_session is None:
+            # Imported here so --help never loads the HTTP stack.
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            # Room for every fallback probe to run at once on reused connections.
+            adapter = HTTPAdapter(pool_maxsize=len(THUMBNAIL_CANDIDATES))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _thumbnail_session = session
+        return _thumbnail_session
+
+
+def _probe_thumbnail(url: str) -> int:
+    """Return the status of a HEAD request for ``url``."""
+    response = thumbnail_session().head(url, timeout=THUMBNAIL_TIMEOUT)
+    response.close()
+    return response.status_code
+
+
+def _stream_to_file(response: requests.Response, destination: Path) -> None:
+    # Write beside the destination and rename, so an interrupted download never
+    # leaves a truncated file that later runs would treat as complete.
+    partial = destination.with_suffix(destination.suffix + ".part")
+    try:
+        with partial.open("wb") as handle:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                handle.write(chunk)
+        os.replace(partial, destination)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+def _fetch_thumbnail(url: str, destination: Path, if_modified_since: float | None) -> bool | None:
+    """GET ``url`` into ``destination``; True when written, False on 304, None on 404."""
+    headers = {}
+    if if_modified_since is not None:
+        headers["If-Modified-Since"] = formatdate(if_modified_since, usegmt=True)
+    with thumbnail_session().get(url, headers=headers, stream=True, timeout=THUMBNAIL_TIMEOUT) as response:
+        if response.status_code == 304:
+            return False
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        _stream_to_file(response, destination)
+        return True
+
+
+def download_thumbnail(video_id: str, destination: Path, *, if_modified_since: float | None = None) -> bool:
+    """Download the best thumbnail for ``video_id`` to ``destination``.
+
+    When ``if_modified_since`` (a POSIX timestamp) is given the request is
+    conditional; returns False without touching ``destination`` on 304.
+    """
+    urls = [template.format(video_id=video_id) for template in _THUMBNAIL_URL_TEMPLATES]
+
+    # maxresdefault exists for most videos, so it is fetched directly.
+    fetched = _fetch_thumbnail(urls[0], destination, if_modified_since)
+    if fetched is not None:
+        return fetched
+
+    # Only when it is missing are the lower resolutions probed, concurrently.
+    # Anything other than a 404 (e.g. a proxy rejecting HEAD) is still tried.
+    fallbacks = urls[1:]
+    with ThreadPoolExecutor(max_workers=len(fallbacks)) as executor:
+        statuses = list(executor.map(_probe_thumbnail, fallbacks))
+    for url, status in zip(fallbacks, statuses):
+        if status == 404:
+            continue
+        fetched = _fetch_thumbnail(url, destination, if_modified_since)
+        if fetched is not None:
+            return fetched
     raise RuntimeError(f"Failed to fetch a thumbnail for video {video_id}")
 
 
+def refresh_thumbnail(video_id: str, thumbnail_path: Path) -> None:
+    """Re-download an existing thumbnail only if YouTube has a newer one.
+
+    Failures only warn: the existing thumbnail is still usable, and an error
+    here must not abort the run before the metadata file is written.
+    """
+    import requests
+
+    try:
+        updated = download_thumbnail(video_id, thumbnail_path, if_modified_since=thumbnail_path.stat().st_mtime)
+    except (RuntimeError, requests.RequestException) as err:
+        print(f"Failed to refresh thumbnail for {video_id}, keeping the existing file: {err}", file=sys.stderr)
+        return
+    if updated:
+        print(f"Refreshed thumbnail for {video_id}")
+    else:
+        print(f"Thumbnail unchanged for {video_id}")
+
+
 def extract_playlist_info(playlist: str, cookie_file: Path | None) -> dict:
     """Fetch playlist metadata without downloading media."""
     opts = {
@@ -136,6 +251,7 @@ def extract_playlist_info(playlist: str, cookie_file: Path | None) -> dict:
     }
     if cookie_file:
         opts["cookiefile"] = str(cookie_file)
+    yt_dlp = load_yt_dlp()
     with yt_dlp.YoutubeDL(opts) as ydl:
         info = ydl.extract_info(playlist, download=False)
     if not info:
@@ -145,10 +261,27 @@ def extract_playlist_info(playlist: str, cookie_file: Path | None) -> dict:
     return info
 
 
-def download_audio(video_url: str, target_dir: Path, cookie_file: Path | None) -> None:
+def download_audio(video_urls: List[str], target_dir: Path, cookie_file: Path | None) -> None:
+    """Download and convert audio for every URL in a single yt_dlp session.
+
+    Each track is written and converted as ``<id>.incoming.*`` and renamed to
+    ``<id>.mp3`` only after every post-processor has finished, so a killed run
+    never leaves a truncated mp3 under the name later runs treat as complete.
+    """
+    # Anything still named *.incoming.mp3 was interrupted during conversion;
+    # yt_dlp would otherwise accept it as already converted.
+    for leftover in target_dir.glob(f"*{INCOMING_SUFFIX}.mp3"):
+        leftover.unlink(missing_ok=True)
+
+    def publish(filepath: str) -> None:
+        converted = Path(filepath)
+        if converted.stem.endswith(INCOMING_SUFFIX):
+            final_name = converted.stem[: -len(INCOMING_SUFFIX)] + converted.suffix
+            os.replace(converted, converted.with_name(final_name))
+
     opts = {
         "format": "bestaudio/best",
-        "outtmpl": str(target_dir / "%(id)s.%(ext)s"),
+        "outtmpl": str(target_dir / f"%(id)s{INCOMING_SUFFIX}.%(ext)s"),
         "noplaylist": True,
         "quiet": False,
         "postprocessors": [
@@ -160,11 +293,79 @@ def download_audio(video_url: str, target_dir: Path, cookie_file: Path | None) -
         ],
         "keepvideo": False,
         "overwrites": False,
+        "concurrent_fragment_downloads": 4,
+        "http_chunk_size": 10 * 1024 * 1024,
+        # Keep going when one video fails; callers detect failures by the missing mp3.
+        "ignoreerrors": True,
     }
     if cookie_file:
         opts["cookiefile"] = str(cookie_file)
+    yt_dlp = load_yt_dlp()
     with yt_dlp.YoutubeDL(opts) as ydl:
-        ydl.download([video_url])
+        ydl.add_post_hook(publish)
+        ydl.download(video_urls)
+
+
+def has_full_metadata(entry: dict) -> bool:
+    """Return True when ``entry`` is a fully extracted video rather than a flat playlist stub."""
+    return entry.get("_type", "video") == "video" and "description" in entry
+
+
+def list_file_names(directory: Path) -> set[str]:
+    """Return the names of the regular files in ``directory``."""
+    with os.scandir(directory) as it:
+        return {entry.name for entry in it if entry.is_file()}
+
+
+def _fetch_info(ydl: yt_dlp.YoutubeDL, video_url: str) -> dict | None:
+    """Return yt_dlp metadata for a single video, or None when extraction fails."""
+    from yt_dlp.utils import DownloadError  # type: ignore
+
+    try:
+        return ydl.extract_info(video_url, download=False)
+    except DownloadError as err:
+        print(f"Skipping {video_url}: {err}", file=sys.stderr)
+        return None
+
+
+def metadata_worker_count() -> int:
+    """Return the metadata prefetch concurrency from Y2W_META_WORKERS (default 8)."""
+    value = os.getenv("Y2W_META_WORKERS", "8")
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise ValueError(f"Y2W_META_WORKERS must be an integer, got {value!r}") from None
+
+
+def prefetch_video_info(video_urls: List[str], cookie_file: Path | None) -> dict[str, dict | None]:
+    """Fetch metadata for all ``video_urls`` concurrently, keyed by URL."""
+    if not video_urls:
+        return {}
+
+    ydl_opts = {"quiet": True}
+    if cookie_file:
+        ydl_opts["cookiefile"] = str(cookie_file)
+
+    # Building a YoutubeDL loads every extractor, so each worker thread creates
+    # one instance and reuses it; instances are not shared across threads.
+    yt_dlp = load_yt_dlp()
+    local = threading.local()
+    instances: List[yt_dlp.YoutubeDL] = []
+
+    def fetch(video_url: str) -> dict | None:
+        ydl = getattr(local, "ydl", None)
+        if ydl is None:
+            ydl = local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+            instances.append(ydl)
+        return _fetch_info(ydl, video_url)
+
+    max_workers = metadata_worker_count()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(video_urls, executor.map(fetch, video_urls)))
+    finally:
+        for ydl in instances:
+            ydl.close()
 
 
 def collect_metadata_and_assets(
@@ -172,8 +373,15 @@ def collect_metadata_and_assets(
     target_dir: Path,
     existing_metadata: dict[str, VideoMetadata],
     cookie_file: Path | None,
+    refresh_thumbnails: bool = False,
 ) -> List[VideoMetadata]:
-    collected: List[VideoMetadata] = []
+    # One directory listing replaces two stat() calls per entry.
+    present = list_file_names(target_dir)
+
+    # First pass: validate entries and work out which videos still need metadata.
+    plan: List[VideoMetadata | tuple[str, str]] = []
+    known_infos: dict[str, dict] = {}
+    planned_ids: set[str] = set()
     for position, entry in enumerate(entries, start=1):
         if entry is None:
             print(f"Skipping entry at position {position}: no data returned", file=sys.stderr)
@@ -189,56 +397,92 @@ def collect_metadata_and_assets(
             print(f"Skipping entry at position {position}: missing video ID", file=sys.stderr)
             continue
 
-        audio_path = target_dir / f"{video_id}.mp3"
-        thumbnail_path = target_dir / f"{video_id}.jpg"
+        if video_id in planned_ids:
+            continue
+        planned_ids.add(video_id)
+
         existing_entry = existing_metadata.get(video_id)
         if existing_entry:
-            if not audio_path.exists() or not thumbnail_path.exists():
+            if f"{video_id}.mp3" not in present or f"{video_id}.jpg" not in present:
                 print(
                     f"Skipping {video_id}: metadata present but media files missing",
                     file=sys.stderr,
                 )
             else:
                 print(f"Skipping {video_id}: already present in metadata")
-            collected.append(existing_entry)
+                if refresh_thumbnails:
+                    refresh_thumbnail(video_id, target_dir / f"{video_id}.jpg")
+            plan.append(existing_entry)
             continue
 
-        ydl_opts = {"quiet": True}
-        if cookie_file:
-            ydl_opts["cookiefile"] = str(cookie_file)
+        plan.append((video_id, video_url))
+        if has_full_metadata(entry):
+            known_infos[video_url] = entry
 
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=False)
-        except DownloadError as err:
-            print(f"Skipping {video_url}: {err}", file=sys.stderr)
-            continue
+    # Entries from a full (non-flat) extraction already carry title and
+    # description, so only the rest need another extractor round trip.
+    infos = prefetch_video_info(
+        [item[1] for item in plan if isinstance(item, tuple) and item[1] not in known_infos],
+        cookie_file,
+    )
+    infos.update(known_infos)
 
-        audio_path = target_dir / f"{video_id}.mp3"
-        if audio_path.exists():
+    # Second pass: queue every missing audio track for a single batched download.
+    pending_urls: List[str] = []
+    for item in plan:
+        if isinstance(item, VideoMetadata):
+            continue
+        video_id, video_url = item
+        if infos.get(video_url) is None:
+            continue
+        if f"{video_id}.mp3" in present:
             print(f"Audio already exists for {video_id}, skipping download")
         else:
-            print(f"Downloading audio for {video_id}")
-            try:
-                download_audio(video_url, target_dir, cookie_file)
-            except DownloadError as err:
-                print(f"Failed to download audio for {video_id}: {err}", file=sys.stderr)
-                continue
-            except RuntimeError as err:
-                print(f"Failed to download audio for {video_id}: {err}", file=sys.stderr)
-                continue
+            pending_urls.append(video_url)
+
+    if pending_urls:
+        from yt_dlp.utils import DownloadError  # type: ignore
+
+        print(f"Downloading audio for {len(pending_urls)} videos")
+        try:
+            download_audio(pending_urls, target_dir, cookie_file)
+        except (DownloadError, RuntimeError) as err:
+            print(f"Audio download stopped early: {err}", file=sys.stderr)
+        present = list_file_names(target_dir)
+
+    import requests
+
+    # Third pass: fetch thumbnails and record metadata, in playlist order.
+    collected: List[VideoMetadata] = []
+    for item in plan:
+        if isinstance(item, VideoMetadata):
+            collected.append(item)
+            continue
+
+        video_id, video_url = item
+        info = infos.get(video_url)
+        if info is None:
+            continue
+
+        if f"{video_id}.mp3" not in present:
+            print(f"Failed to download audio for {video_id}", file=sys.stderr)
+            continue
 
         thumbnail_path = target_dir / f"{video_id}.jpg"
-        if thumbnail_path.exists():
-            print(f"Thumbnail already exists for {video_id}, skipping download")
+        if thumbnail_path.name in present:
+            if refresh_thumbnails:
+                refresh_thumbnail(video_id, thumbnail_path)
+            else:
+                print(f"Thumbnail already exists for {video_id}, skipping download")
         else:
             print(f"Downloading thumbnail for {video_id}")
             try:
                 download_thumbnail(video_id, thumbnail_path)
-            except RuntimeError as err:
+            except (RuntimeError, requests.RequestException) as err:
                 print(f"Failed to download thumbnail for {video_id}: {err}", file=sys.stderr)
                 thumbnail_path.unlink(missing_ok=True)
                 continue
+            present.add(thumbnail_path.name)
 
         title = info.get("title") or ""
         description = info.get("description") or ""
@@ -250,7 +494,10 @@ def collect_metadata_and_assets(
 
 def write_metadata_file(metadata: List[VideoMetadata], destination: Path) -> None:
     payload = [item.to_dict() for item in metadata]
-    destination.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    if orjson:
+        destination.write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+    else:
+        destination.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
 
 
 def main(argv: Iterable[str] | None = None) -> None:
@@ -260,6 +507,13 @@ def main(argv: Iterable[str] | None = None) -> None:
         print(f"Cookies file not found: {args.cookies_file}", file=sys.stderr)
         sys.exit(1)
 
+    # Checked up front so a bad value cannot abort the run after downloads start.
+    try:
+        metadata_worker_count()
+    except ValueError as err:
+        print(str(err), file=sys.stderr)
+        sys.exit(1)
+
     try:
         playlist_info = extract_playlist_info(args.playlist, args.cookies_file)
     except Exception as exc:  # noqa: BLE001 - surface helpful failure to CLI
@@ -281,6 +535,7 @@ def main(argv: Iterable[str] | None = None) -> None:
         target_dir,
         existing_metadata,
         args.cookies_file,
+        refresh_thumbnails=args.refresh_thumbnails,
     )
     write_metadata_file(metadata, metadata_path)
     print(f"Metadata written to {metadata_path}")
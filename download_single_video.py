@@ -7,16 +7,11 @@ import sys
 from pathlib import Path
 from typing import Iterable
 
-try:
-    from yt_dlp.utils import DownloadError  # type: ignore
-    import yt_dlp  # type: ignore
-except ImportError as err:  # pragma: no cover - surfaced to CLI
-    print("yt_dlp is required to run this script. Install it with 'pip install yt-dlp'.", file=sys.stderr)
-    raise
-
 from download_playlist import (  # type: ignore
     collect_metadata_and_assets,
     load_existing_metadata,
+    load_yt_dlp,
+    metadata_worker_count,
     sanitize_path_segment,
     write_metadata_file,
 )
@@ -43,6 +38,11 @@ def parse_args(argv: Iterable[str]) -> argparse.Namespace:
         type=Path,
         help="Path to cookies file exported from a browser for authenticated YouTube access",
     )
+    parser.add_argument(
+        "--refresh-thumbnails",
+        action="store_true",
+        help="Re-check existing thumbnails and download them again only if YouTube has a newer version",
+    )
     return parser.parse_args(argv)
 
 
@@ -54,6 +54,7 @@ def fetch_video_info(video_url: str, cookie_file: Path | None) -> dict:
     }
     if cookie_file:
         opts["cookiefile"] = str(cookie_file)
+    yt_dlp = load_yt_dlp()
     with yt_dlp.YoutubeDL(opts) as ydl:
         info = ydl.extract_info(video_url, download=False)
     if not info:
@@ -68,6 +69,12 @@ def main(argv: Iterable[str] | None = None) -> None:
         print(f"Cookies file not found: {args.cookies_file}", file=sys.stderr)
         sys.exit(1)
 
+    try:
+        metadata_worker_count()
+    except ValueError as err:
+        print(str(err), file=sys.stderr)
+        sys.exit(1)
+
     name = args.playlist_name.strip()
     if not name:
         print("Playlist name cannot be empty.", file=sys.stderr)
@@ -85,6 +92,9 @@ def main(argv: Iterable[str] | None = None) -> None:
     metadata_path = target_dir / args.metadata_file
     existing_metadata = load_existing_metadata(metadata_path)
 
+    load_yt_dlp()
+    from yt_dlp.utils import DownloadError  # type: ignore
+
     try:
         video_info = fetch_video_info(args.video_url, args.cookies_file)
     except DownloadError as err:
@@ -102,6 +112,7 @@ def main(argv: Iterable[str] | None = None) -> None:
         target_dir,
         existing_metadata,
         args.cookies_file,
+        refresh_thumbnails=args.refresh_thumbnails,
     )
 
     if not metadata_entries:
@@ -5,18 +5,32 @@ from __future__ import annotations
 import argparse
 import json
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, Iterator
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
     from requests.auth import HTTPBasicAuth
+    from urllib3.util import Retry
 except ImportError as err:
     print("The 'requests' library is required. Install it with 'pip install requests'.", file=sys.stderr)
     raise
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional speedup, stdlib json is used instead
+    orjson = None
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover - optional, metadata is then parsed in one go
+    ijson = None
+
 
 # Supported file extensions mapped to MIME types.
 AUDIO_MIME_TYPES = {
@@ -34,11 +48,34 @@ IMAGE_MIME_TYPES = {
     ".webp": "image/webp",
 }
 
+# WordPress collapses runs of "-" in slugs and file names.
+_DASH_RUN_RE = re.compile(r"-+")
+
+# KEY=value, KEY="value" or KEY='value'. Unquoted values keep inner spaces and
+# "#" (application passwords contain spaces); comment lines never match.
+_ENV_LINE_RE = re.compile(r"""^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(?:(["'])(.*)\2|(.*?))\s*$""")
+
+# Extension -> (kind, preference rank, MIME type) for index_media_files().
+_MEDIA_EXTENSIONS = {
+    **{extension: ("audio", rank, mime) for rank, (extension, mime) in enumerate(AUDIO_MIME_TYPES.items())},
+    **{extension: ("thumbnail", rank, mime) for rank, (extension, mime) in enumerate(IMAGE_MIME_TYPES.items())},
+}
+
+HTTP_POOL_SIZE = 16
+# Stems per existing-media lookup; each stem queries two slugs and the REST
+# API caps per_page at 100.
+MEDIA_LOOKUP_CHUNK = 50
+# Longest server error detail echoed back to the user.
+ERROR_DETAIL_LIMIT = 200
+
 
 @dataclass
 class MediaTarget:
     """Represents a file that should be uploaded along with its metadata."""
 
+    # Declared by hand rather than with dataclass(slots=True), which needs Python 3.10.
+    __slots__ = ("video_id", "path", "kind", "mime_type", "title", "description")
+
     video_id: str
     path: Path
     kind: str  # "audio" or "thumbnail"
@@ -68,6 +105,16 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         action="store_true",
         help="List the files that would be uploaded without sending them to WordPress",
     )
+    parser.add_argument(
+        "--reupload",
+        action="store_true",
+        help="Upload files even when a matching attachment already exists on the site",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Maximum number of files uploaded in parallel (default: WP_MAX_CONCURRENT_UPLOADS or 8)",
+    )
     parser.add_argument(
         "--skip-missing",
         action="store_true",
@@ -82,34 +129,51 @@ def load_env_file(path: Path) -> None:
     if not path.exists():
         raise FileNotFoundError(f"Env file not found: {path}")
 
-    for raw_line in path.read_text(encoding="utf-8").splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("#"):
-            continue
-        if "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        key = key.strip()
-        if not key:
-            continue
-        value = value.strip().strip('"').strip("'")
-        os.environ[key] = value
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            match = _ENV_LINE_RE.match(line)
+            if match is None:
+                continue
+            key, quote, quoted, bare = match.groups()
+            os.environ[key] = quoted if quote else bare
+
+
+def iter_metadata_items(metadata_path: Path) -> Iterator[object]:
+    """Yield the elements of the top-level JSON array in ``metadata_path``.
+
+    With ijson installed the array is streamed one element at a time, so large
+    metadata dumps never sit in memory as both bytes and parsed objects.
+    """
+    if ijson is None:
+        raw = metadata_path.read_bytes()
+        try:
+            payload = orjson.loads(raw) if orjson else json.loads(raw)
+        except json.JSONDecodeError as err:
+            raise ValueError(f"Could not parse {metadata_path}: {err}") from err
+        if not isinstance(payload, list):
+            raise ValueError("Metadata JSON must contain a list of entries")
+        yield from payload
+        return
+
+    with metadata_path.open("rb") as handle:
+        first = handle.read(1)
+        while first.isspace():
+            first = handle.read(1)
+        if first != b"[":
+            raise ValueError("Metadata JSON must contain a list of entries")
+        handle.seek(0)
+        try:
+            yield from ijson.items(handle, "item")
+        except ijson.JSONError as err:
+            raise ValueError(f"Could not parse {metadata_path}: {err}") from err
 
 
 def load_metadata(metadata_path: Path) -> list[dict[str, str]]:
     if not metadata_path.exists():
         raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
 
-    try:
-        payload = json.loads(metadata_path.read_text(encoding="utf-8"))
-    except json.JSONDecodeError as err:
-        raise ValueError(f"Could not parse {metadata_path}: {err}") from err
-
-    if not isinstance(payload, list):
-        raise ValueError("Metadata JSON must contain a list of entries")
-
     entries: list[dict[str, str]] = []
-    for item in payload:
+    for item in iter_metadata_items(metadata_path):
         if not isinstance(item, dict):
             continue
         video_id = item.get("id")
@@ -125,25 +189,43 @@ def load_metadata(metadata_path: Path) -> list[dict[str, str]]:
     return entries
 
 
-def iter_media_targets(source_dir: Path, metadata: list[dict[str, str]], skip_missing: bool) -> Iterator[MediaTarget]:
+def index_media_files(source_dir: Path) -> tuple[dict[str, tuple[Path, str]], dict[str, tuple[Path, str]]]:
+    """Map each video ID to its audio and thumbnail ``(path, mime_type)`` from one directory scan.
+
+    When a video has several candidates, the extension listed first in
+    AUDIO_MIME_TYPES / IMAGE_MIME_TYPES wins.
+    """
+    ranked: dict[str, dict[str, tuple[int, Path, str]]] = {"audio": {}, "thumbnail": {}}
+    with os.scandir(source_dir) as it:
+        for entry in it:
+            stem, _, extension = entry.name.rpartition(".")
+            spec = _MEDIA_EXTENSIONS.get("." + extension.lower())
+            # is_file() answers from the cached d_type; only symlinks cost a stat.
+            if not stem or spec is None or not entry.is_file():
+                continue
+            kind, rank, mime_type = spec
+            current = ranked[kind].get(stem)
+            if current is None or rank < current[0]:
+                ranked[kind][stem] = (rank, Path(entry.path), mime_type)
+
+    audio_index = {stem: (path, mime_type) for stem, (_, path, mime_type) in ranked["audio"].items()}
+    thumb_index = {stem: (path, mime_type) for stem, (_, path, mime_type) in ranked["thumbnail"].items()}
+    return audio_index, thumb_index
+
+
+def iter_media_targets(
+    source_dir: Path, metadata: list[dict[str, str]], skip_missing: bool
+) -> Iterator[tuple[MediaTarget, MediaTarget]]:
+    """Yield one ``(audio, thumbnail)`` pair per video so both can be uploaded together."""
+    audio_index, thumb_index = index_media_files(source_dir)
+
     for record in metadata:
         video_id = record["id"]
         title = record.get("title", "")
         description = record.get("description", "")
 
-        audio_path = None
-        for extension, mime_type in AUDIO_MIME_TYPES.items():
-            candidate = source_dir / f"{video_id}{extension}"
-            if candidate.exists():
-                audio_path = (candidate, mime_type)
-                break
-
-        thumbnail_path = None
-        for extension, mime_type in IMAGE_MIME_TYPES.items():
-            candidate = source_dir / f"{video_id}{extension}"
-            if candidate.exists():
-                thumbnail_path = (candidate, mime_type)
-                break
+        audio_path = audio_index.get(video_id)
+        thumbnail_path = thumb_index.get(video_id)
 
         if audio_path is None or thumbnail_path is None:
             message = (
@@ -158,11 +240,96 @@ def iter_media_targets(source_dir: Path, metadata: list[dict[str, str]], skip_mi
         audio_file, audio_mime = audio_path
         thumb_file, thumb_mime = thumbnail_path
 
-        yield MediaTarget(video_id=video_id, path=audio_file, kind="audio", mime_type=audio_mime, title=title, description=description)
-        yield MediaTarget(video_id=video_id, path=thumb_file, kind="thumbnail", mime_type=thumb_mime, title=title, description=description)
+        yield (
+            MediaTarget(video_id=video_id, path=audio_file, kind="audio", mime_type=audio_mime, title=title, description=description),
+            MediaTarget(video_id=video_id, path=thumb_file, kind="thumbnail", mime_type=thumb_mime, title=title, description=description),
+        )
+
+
+def build_session(username: str, app_password: str, pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """Return an authenticated keep-alive session shared by all upload workers."""
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(username, app_password)
+    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def error_detail(response: requests.Response) -> str:
+    """Return a short description of a failed WordPress response.
+
+    Prefers the ``message`` field of the REST error JSON and caps the result so
+    an HTML error page or oversized body is never dumped to the console.
+    """
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and payload.get("message"):
+        return str(payload["message"])[:ERROR_DETAIL_LIMIT]
+    return response.text[:ERROR_DETAIL_LIMIT].strip()
+
+
+def wordpress_slug(stem: str) -> str:
+    """Return the slug WordPress stores for ``stem`` (``sanitize_title`` for ID-safe characters)."""
+    return _DASH_RUN_RE.sub("-", stem.lower()).strip("-")
+
 
+def wordpress_file_stem(stem: str) -> str:
+    """Return ``stem`` as it appears in the uploaded file name (``sanitize_file_name``)."""
+    return _DASH_RUN_RE.sub("-", stem).lstrip("-_")
 
-def upload_media_file(site: str, auth: HTTPBasicAuth, target: MediaTarget) -> dict:
+
+def find_existing_media(session: requests.Session, site: str, stems: Iterable[str]) -> dict[tuple[str, str], dict]:
+    """Return attachments already uploaded for ``stems``, keyed by ``(stem, media_type)``.
+
+    ``media_type`` is the top-level MIME type ("audio" or "image"). Audio and
+    thumbnail share a file stem, so WordPress slugs the second upload
+    ``<stem>-2``; both slugs are queried and the media type tells them apart.
+    Only the top-level type is compared because WordPress may store a
+    different subtype than ours (e.g. ``audio/mpeg`` for ``.m4a``).
+    """
+    media_endpoint = site.rstrip("/") + "/wp-json/wp/v2/media"
+    unique_stems = list(dict.fromkeys(stems))
+    existing: dict[tuple[str, str], dict] = {}
+
+    for start in range(0, len(unique_stems), MEDIA_LOOKUP_CHUNK):
+        # Compare in WordPress's normalised form: slugs are lower-cased and
+        # dash-trimmed, while file names keep their case.
+        slug_to_stem: dict[str, str] = {}
+        for stem in unique_stems[start : start + MEDIA_LOOKUP_CHUNK]:
+            slug = wordpress_slug(stem)
+            slug_to_stem[slug] = stem
+            slug_to_stem[f"{slug}-2"] = stem
+
+        page = 1
+        while True:
+            params = {
+                "slug": ",".join(slug_to_stem),
+                "per_page": 100,
+                "page": page,
+                "_fields": "id,slug,source_url,mime_type",
+            }
+            response = session.get(media_endpoint, params=params, timeout=30)
+            if response.status_code >= 400:
+                raise RuntimeError(f"Failed to look up existing media: {response.status_code} {error_detail(response)}")
+            for item in response.json():
+                stem = slug_to_stem.get(item.get("slug", ""))
+                file_name = item.get("source_url", "").rsplit("/", 1)[-1]
+                if stem is not None and file_name.startswith(wordpress_file_stem(stem)):
+                    media_type = item.get("mime_type", "").split("/", 1)[0]
+                    existing.setdefault((stem, media_type), item)
+            total_pages = int(response.headers.get("X-WP-TotalPages") or 1)
+            if page >= total_pages:
+                break
+            page += 1
+
+    return existing
+
+
+def upload_media_file(session: requests.Session, site: str, target: MediaTarget) -> dict:
     media_endpoint = site.rstrip("/") + "/wp-json/wp/v2/media"
     headers = {
         "Content-Disposition": f'attachment; filename="{target.path.name}"',
@@ -170,43 +337,81 @@ def upload_media_file(site: str, auth: HTTPBasicAuth, target: MediaTarget) -> di
         "Slug": target.path.stem,
     }
 
+    # Attachment fields travel as query parameters on the upload itself, which
+    # WordPress applies when creating the item, so no follow-up update is needed.
+    # An explicit slug keeps the file-stem slug WordPress would otherwise derive
+    # from the new title.
+    params = {
+        "title": target.title or target.path.stem,
+        "slug": target.path.stem,
+    }
+    if target.kind == "thumbnail" and target.description:
+        params["alt_text"] = target.title or target.description[:120]
+
     with target.path.open("rb") as handle:
-        response = requests.post(
+        response = session.post(
             media_endpoint,
             headers=headers,
+            params=params,
             data=handle,
-            auth=auth,
             timeout=120,
         )
 
     if response.status_code >= 400:
         raise RuntimeError(
-            f"Failed to upload {target.path.name} ({target.kind}): {response.status_code} {response.text.strip()}"
+            f"Failed to upload {target.path.name} ({target.kind}): {response.status_code} {error_detail(response)}"
         )
 
     return response.json()
 
 
-def update_media_metadata(site: str, auth: HTTPBasicAuth, media_id: int, target: MediaTarget) -> None:
-    payload = {
-        "title": target.title or target.path.stem,
-    }
-    if target.kind == "thumbnail" and target.description:
-        payload["alt_text"] = target.title or target.description[:120]
+def main(argv: Iterable[str] | None = None) -> None:
+    args = parse_args(argv)
 
-    # WordPress expects POST to update existing media items.
-    media_endpoint = site.rstrip("/") + f"/wp-json/wp/v2/media/{media_id}"
+    if args.max_concurrency is not None and args.max_concurrency < 1:
+        print("--max-concurrency must be at least 1.", file=sys.stderr)
+        sys.exit(1)
 
-    response = requests.post(media_endpoint, json=payload, auth=auth, timeout=60)
-    if response.status_code >= 400:
-        raise RuntimeError(
-            f"Failed to update metadata for media {media_id}: {response.status_code} {response.text.strip()}"
-        )
+    source_dir = args.source
+    if not source_dir.is_dir():
+        print(f"Source directory not found: {source_dir.resolve()}", file=sys.stderr)
+        sys.exit(1)
 
+    metadata_path = Path(args.metadata_file)
+    if not metadata_path.is_absolute():
+        metadata_path = source_dir / metadata_path
 
-def main(argv: Iterable[str] | None = None) -> None:
-    args = parse_args(argv)
+    try:
+        metadata = load_metadata(metadata_path)
+    except (ValueError, FileNotFoundError) as exc:
+        print(str(exc), file=sys.stderr)
+        sys.exit(1)
 
+    if not metadata:
+        print(f"No entries found in metadata file {metadata_path}", file=sys.stderr)
+        sys.exit(1)
+
+    # Resolve every pair before anything is uploaded so a missing file aborts
+    # the run up front rather than after earlier uploads went out.
+    try:
+        pairs = list(iter_media_targets(source_dir, metadata, args.skip_missing))
+    except FileNotFoundError as exc:
+        print(str(exc), file=sys.stderr)
+        sys.exit(1)
+
+    if not pairs:
+        print("Nothing to upload. All items were skipped or missing.")
+        return
+
+    if args.dry_run:
+        for pair in pairs:
+            for target in pair:
+                print(f"Preparing {target.kind} for {target.video_id}: {target.path}")
+        print("Dry run complete. No files were uploaded.")
+        return
+
+    # Credentials are only needed to talk to WordPress, so a dry run can
+    # inspect file selection without any env file or site configuration.
     env_file = args.env_file
     if env_file is None:
         default_env = Path("wp.env")
@@ -232,58 +437,65 @@ def main(argv: Iterable[str] | None = None) -> None:
         )
         sys.exit(1)
 
-    source_dir = args.source.resolve()
-    if not source_dir.exists() or not source_dir.is_dir():
-        print(f"Source directory not found: {source_dir}", file=sys.stderr)
-        sys.exit(1)
-
-    metadata_path = Path(args.metadata_file)
-    if not metadata_path.is_absolute():
-        metadata_path = source_dir / metadata_path
-
-    try:
-        metadata = load_metadata(metadata_path)
-    except (ValueError, FileNotFoundError) as exc:
-        print(str(exc), file=sys.stderr)
-        sys.exit(1)
-
-    if not metadata:
-        print(f"No entries found in metadata file {metadata_path}", file=sys.stderr)
-        sys.exit(1)
-
-    auth = HTTPBasicAuth(username, app_password)
-
-    targets = list(iter_media_targets(source_dir, metadata, args.skip_missing))
-
-    if not targets:
-        print("Nothing to upload. All items were skipped or missing.")
-        return
-
-    for target in targets:
-        print(f"Preparing {target.kind} for {target.video_id}: {target.path}")
-
-    if args.dry_run:
-        print("Dry run complete. No files were uploaded.")
-        return
-
-    successes = 0
-    for target in targets:
+    max_workers = args.max_concurrency
+    if max_workers is None:
         try:
-            response = upload_media_file(site, auth, target)
-            media_id = response.get("id")
-            if isinstance(media_id, int):
+            max_workers = max(1, int(os.getenv("WP_MAX_CONCURRENT_UPLOADS", "8")))
+        except ValueError:
+            print("WP_MAX_CONCURRENT_UPLOADS must be an integer.", file=sys.stderr)
+            sys.exit(1)
+    successes = 0
+    skipped = 0
+    aborted = False
+    with build_session(username, app_password, pool_size=max(HTTP_POOL_SIZE, max_workers)) as session:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            try:
+                # Match against existing media a chunk at a time: uploads for one
+                # chunk start while the next chunk's lookup is in flight.
+                for start in range(0, len(pairs), MEDIA_LOOKUP_CHUNK):
+                    chunk = pairs[start : start + MEDIA_LOOKUP_CHUNK]
+                    existing: dict[tuple[str, str], dict] = {}
+                    if not args.reupload:
+                        existing = find_existing_media(session, site, (audio.path.stem for audio, _ in chunk))
+                    # Submit each video's audio and thumbnail back to back so
+                    # the pair uploads side by side.
+                    for pair in chunk:
+                        for target in pair:
+                            item = existing.get((target.path.stem, target.mime_type.split("/", 1)[0]))
+                            if item is not None:
+                                print(
+                                    f"Skipping {target.kind} for {target.video_id}: already uploaded as attachment ID {item.get('id', 'unknown')}"
+                                )
+                                skipped += 1
+                                continue
+                            print(f"Preparing {target.kind} for {target.video_id}: {target.path}")
+                            futures[executor.submit(upload_media_file, session, site, target)] = target
+            except (RuntimeError, requests.RequestException) as exc:
+                print(str(exc), file=sys.stderr)
+                aborted = True
+                # Drop uploads that have not started yet; in-flight ones finish.
+                futures = {future: target for future, target in futures.items() if not future.cancel()}
+
+            for future in as_completed(futures):
+                target = futures[future]
                 try:
-                    update_media_metadata(site, auth, media_id, target)
-                except RuntimeError as meta_err:
-                    print(str(meta_err), file=sys.stderr)
-            print(
-                f"Uploaded {target.kind} for {target.video_id} as attachment ID {response.get('id', 'unknown')}"
-            )
-            successes += 1
-        except Exception as err:  # noqa: BLE001 - surface upload failure to CLI
-            print(str(err), file=sys.stderr)
-
-    print(f"Upload complete. {successes} files succeeded, {len(targets) - successes} failed.")
+                    response = future.result()
+                except Exception as err:  # noqa: BLE001 - surface upload failure to CLI
+                    print(str(err), file=sys.stderr)
+                    continue
+                print(
+                    f"Uploaded {target.kind} for {target.video_id} as attachment ID {response.get('id', 'unknown')}"
+                )
+                successes += 1
+
+    if aborted:
+        print(f"Upload aborted. {successes} files succeeded before stopping.", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Upload complete. {successes} files succeeded, {len(futures) - successes} failed, "
+        f"{skipped} already on the site."
+    )
 
 
 if __name__ == "__main__":